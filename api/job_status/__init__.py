@@ -8,15 +8,15 @@ import logging
 import json
 import azure.functions as func
 
-# Import shared modules
-import sys
-import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
+# The Functions host puts the app root (api/) on sys.path, so shared is importable directly
 from shared.vm_provisioner import get_vm_provisioner
 
 logger = logging.getLogger(__name__)
 
+# Constant response parts, built once per worker instead of on every poll
+_MISSING_ID_BODY = json.dumps({"error": "Missing 'id' query parameter"})
+_NO_CACHE_HEADERS = {"Cache-Control": "no-cache, no-store, must-revalidate"}
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -37,7 +37,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         
         if not operation_id:
             return func.HttpResponse(
-                json.dumps({"error": "Missing 'id' query parameter"}),
+                _MISSING_ID_BODY,
                 status_code=400,
                 mimetype="application/json"
             )
@@ -57,9 +57,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             )
         
         # Build response from Azure data
+        vm_status = status_data.get('status', 'Unknown')
         response_data = {
             "operationId": operation_id,
-            "runtimeStatus": status_data.get('status', 'Unknown')
+            "runtimeStatus": vm_status
         }
         
         # Add progress if available
@@ -67,7 +68,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             response_data['progress'] = status_data['progress']
         
         # Add output if completed
-        if status_data.get('status') == 'Succeeded':
+        if vm_status == 'Succeeded':
             response_data['output'] = {
                 'vmName': status_data.get('vmName'),
                 'publicIp': status_data.get('publicIp'),
@@ -77,7 +78,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             response_data['runtimeStatus'] = 'Completed'
         
         # Add error if failed
-        if status_data.get('status') == 'Failed' and 'error' in status_data:
+        elif vm_status == 'Failed' and 'error' in status_data:
             response_data['error'] = status_data['error']
             response_data['runtimeStatus'] = 'Failed'
         
@@ -86,9 +87,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps(response_data),
             status_code=200,
             mimetype="application/json",
-            headers={
-                "Cache-Control": "no-cache, no-store, must-revalidate"
-            }
+            headers=_NO_CACHE_HEADERS
         )
         
     except Exception as e:
@@ -3,6 +3,7 @@ Authentication and authorization utilities for Azure Static Web Apps.
 Uses SWA's built-in role-based authentication.
 """
 import base64
+import functools
 import json
 import logging
 import os
@@ -11,9 +12,16 @@ from typing import Optional, Tuple
 logger = logging.getLogger(__name__)
 
 
+# App settings are fixed for the lifetime of the Functions host process (changing
+# them restarts the host), so DRY_RUN is read once at import
+_DRY_RUN = os.environ.get('DRY_RUN', 'false').lower() == 'true'
+# Running locally is detected by AzureWebJobsStorage being empty
+_LOCAL_DEV = not os.environ.get('AzureWebJobsStorage')
+
+
 def is_dry_run() -> bool:
     """Check if dry run mode is enabled."""
-    return os.environ.get('DRY_RUN', 'false').lower() == 'true'
+    return _DRY_RUN
 
 
 def validate_user(req) -> Tuple[bool, Optional[str], Optional[str]]:
@@ -36,18 +44,31 @@ def validate_user(req) -> Tuple[bool, Optional[str], Optional[str]]:
         return True, 'dry-run-user@example.com', None
     
     # When running locally (AzureWebJobsStorage is empty), skip authentication
-    if not os.environ.get('AzureWebJobsStorage'):
+    if _LOCAL_DEV:
         logger.info('LOCAL DEVELOPMENT: Skipping authentication for local testing')
         return True, 'local-dev-user@example.com', None
     
+    # Get the X-MS-CLIENT-PRINCIPAL header
+    principal_header = req.headers.get('X-MS-CLIENT-PRINCIPAL')
+    
+    if not principal_header:
+        logger.warning('No X-MS-CLIENT-PRINCIPAL header found')
+        return False, None, 'Authentication required'
+    
+    return _validate_principal(principal_header)
+
+
+@functools.lru_cache(maxsize=256)
+def _validate_principal(principal_header: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Decode an X-MS-CLIENT-PRINCIPAL header value and check for the 'invited' role.
+    The result depends only on the header, so repeated polls from the same client
+    are answered from the cache.
+    
+    Returns:
+        tuple: (is_valid, email, error_message)
+    """
     try:
-        # Get the X-MS-CLIENT-PRINCIPAL header
-        principal_header = req.headers.get('X-MS-CLIENT-PRINCIPAL')
-        
-        if not principal_header:
-            logger.warning('No X-MS-CLIENT-PRINCIPAL header found')
-            return False, None, 'Authentication required'
-        
         # Decode the base64 JSON payload
         principal_json = base64.b64decode(principal_header).decode('utf-8')
         principal_data = json.loads(principal_json)
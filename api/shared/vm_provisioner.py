@@ -11,60 +11,195 @@ import json
 import re
 import io
 import textwrap
-import paramiko
-from azure.identity import ClientSecretCredential
-from azure.mgmt.compute import ComputeManagementClient
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.resource import ResourceManagementClient
-from typing import Tuple, Optional, Dict
+import functools
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
+from azure.core.pipeline.transport import RequestsTransport
+from typing import Tuple, Optional, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import paramiko
+    from azure.identity import ClientSecretCredential
+    from azure.mgmt.compute import ComputeManagementClient
+    from azure.mgmt.network import NetworkManagementClient
+    from azure.mgmt.resource import ResourceManagementClient
 
 logger = logging.getLogger(__name__)
 
+# LRO polling intervals (seconds), passed as polling_interval. The SDK default of 30s
+# dominates the wall time of short operations; a Retry-After header from ARM (e.g. when
+# throttling) still takes precedence.
+_LRO_POLLING_INTERVAL = 2
+_RUN_COMMAND_POLLING_INTERVAL = 1
+
+
+# Shared NSG rules: WireGuard from anywhere, SSH only from Azure Functions ranges
+_NSG_SECURITY_RULES = [
+    {
+        'name': 'AllowWireGuard',
+        'protocol': 'Udp',
+        'source_port_range': '*',
+        'destination_port_range': '51820',
+        'source_address_prefix': '*',
+        'destination_address_prefix': '*',
+        'access': 'Allow',
+        'priority': 100,
+        'direction': 'Inbound'
+    },
+    {
+        'name': 'AllowSSHFromFunctions',
+        'protocol': 'Tcp',
+        'source_port_range': '*',
+        'destination_port_range': '22',
+        'source_address_prefixes': [
+            '20.38.64.0/19',
+            '20.39.0.0/16',
+            '20.40.0.0/13',
+            '20.48.0.0/12',
+            '20.64.0.0/10'
+        ],
+        'destination_address_prefix': '*',
+        'access': 'Allow',
+        'priority': 110,
+        'direction': 'Inbound'
+    }
+]
+
+# Fixed parts of the VM definition. The SDK serializes these without modifying them,
+# so every create_vm call shares the same objects.
+_VM_HARDWARE_PROFILE = {
+    'vm_size': 'Standard_B1ls'  # Cheapest size, sufficient for WireGuard
+}
+_VM_OS_DISK = {
+    'create_option': 'FromImage',
+    'managed_disk': {
+        'storage_account_type': 'Standard_LRS'
+    }
+}
+_VM_TAGS = {
+    'purpose': 'wireguard-vpn',
+    'auto-delete': 'true',
+    'created-by': 'wireguard-spa'
+}
+
+
+# Single-pass scanner for the client config markers and the sections it must contain
+# ([Interface] followed by [Peer])
+_WIREGUARD_CONFIG_SCAN = re.compile(
+    r'(=== WIREGUARD_CLIENT_CONFIG_START ===)'
+    r'|(=== WIREGUARD_CLIENT_CONFIG_END ===)'
+    r'|(\[Interface\])'
+    r'|(\[Peer\])'
+)
+
+
+# App settings are fixed for the lifetime of the Functions host process (changing
+# them restarts the host), so DRY_RUN is read once at import
+_DRY_RUN = os.environ.get('DRY_RUN', 'false').lower() == 'true'
+
 
 def is_dry_run() -> bool:
     """Check if dry run mode is enabled."""
-    return os.environ.get('DRY_RUN', 'false').lower() == 'true'
+    return _DRY_RUN
+
+
+# Sample WireGuard client config (dry run / fallback), split around the endpoint IP
+_SAMPLE_CONFIG_PREFIX = """[Interface]
+PrivateKey = cOFA1gfMGvoDSJHKOlk5XaXDQZCOVAn3wR4SbQsXX3Q=
+Address = 10.13.13.2/24
+DNS = 1.1.1.1
+
+[Peer]
+PublicKey = n/fMKKDjMxKNvSZHQTWYUCYDcTGgTwMJkLc0X7rTgXo=
+Endpoint = """
+_SAMPLE_CONFIG_SUFFIX = """:51820
+AllowedIPs = 0.0.0.0/0, ::/0
+PersistentKeepalive = 25
+"""
 
 
-# Dry run state storage (in-memory for local development)
-_dry_run_operations = {}
+@functools.lru_cache(maxsize=64)
+def _get_sample_config(public_ip: str = '203.0.113.42') -> str:
+    """Generate sample WireGuard configuration (fallback)."""
+    return _SAMPLE_CONFIG_PREFIX + public_ip + _SAMPLE_CONFIG_SUFFIX
 
 
 def get_dry_run_status(operation_id: str) -> Dict:
     """Get the status of a dry run operation with realistic timing."""
-    current_time = time.time()
-    
-    if operation_id not in _dry_run_operations:
-        # Initialize new operation
-        _dry_run_operations[operation_id] = {
-            'start_time': current_time,
-            'status': 'Running',
-            'public_ip': '203.0.113.42'
-        }
-    
-    operation = _dry_run_operations[operation_id]
-    elapsed = current_time - operation['start_time']
+    # Dry run IDs ('dry-run-{ts}', 'wg-{ts}') embed their creation time, so the
+    # status is computed without storing any per-operation state. IDs without a
+    # timestamp were not issued by this process and are treated as finished.
+    suffix = operation_id.rsplit('-', 1)[-1]
+    start_time = int(suffix) if suffix.isdigit() else None
+    elapsed = time.time() - start_time if start_time is not None else float('inf')
     
     # Simulate realistic provisioning timeline:
     # 0-3s: Creating
     # 3-8s: Running  
     # 8s+: Succeeded
     if elapsed < 3:
-        operation['status'] = 'Creating'
+        status = 'Creating'
     elif elapsed < 8:
-        operation['status'] = 'Running'
+        status = 'Running'
+    else:
+        status = 'Succeeded'
+    
+    return {
+        'start_time': start_time,
+        'status': status,
+        'public_ip': '203.0.113.42'
+    }
+
+
+@functools.lru_cache(maxsize=4)
+def _load_ssh_private_key(ssh_private_key_b64: str) -> 'paramiko.PKey':
+    """
+    Decode and parse a base64-encoded SSH private key (cached per process).
+    OpenSSH-format keys are tried as Ed25519 first, falling back to RSA.
+    """
+    # paramiko (and the cryptography backend it loads) is only needed on the SSH path,
+    # so it is imported here rather than on every cold start
+    import paramiko
+    
+    ssh_private_key_bytes = base64.b64decode(ssh_private_key_b64)
+    
+    if ssh_private_key_bytes.startswith(b'-----BEGIN OPENSSH'):
+        key_classes = (paramiko.Ed25519Key, paramiko.RSAKey)
     else:
-        operation['status'] = 'Succeeded'
+        key_classes = (paramiko.RSAKey,)
     
-    return operation
+    last_error = None
+    for key_class in key_classes:
+        try:
+            return key_class.from_private_key(io.StringIO(ssh_private_key_bytes.decode('ascii')))
+        except paramiko.SSHException as e:
+            last_error = e
+    raise last_error
+
+
+# Process-wide Azure credential and management clients, reused across invocations
+# so the credential's in-memory token cache survives between requests
+_azure_clients_lock = threading.Lock()
+_cached_credential = None
+_cached_credential_key = None
+_cached_clients = {}
 
 
-def get_azure_credential() -> Tuple[bool, Optional[str], Optional[ClientSecretCredential]]:
+def get_azure_credential() -> Tuple[bool, Optional[str], Optional['ClientSecretCredential']]:
     """
-    Create Azure credential using Service Principal.
+    Get the Azure credential using Service Principal (created once per process).
     Returns: (success, error_message, credential)
     """
+    global _cached_credential, _cached_credential_key
+    
     try:
+        # Imported here rather than at module level: dry run never creates a credential,
+        # and azure.identity adds noticeably to a cold start
+        from azure.identity import ClientSecretCredential
+        
         client_id = os.environ.get('AZURE_CLIENT_ID')
         client_secret = os.environ.get('AZURE_CLIENT_SECRET')
         tenant_id = os.environ.get('AZURE_TENANT_ID')
@@ -72,11 +207,17 @@ def get_azure_credential() -> Tuple[bool, Optional[str], Optional[ClientSecretCr
         if not all([client_id, client_secret, tenant_id]):
             return False, "Missing Azure credentials (AZURE_CLIENT_ID, AZURE_CLIENT_SECRET, AZURE_TENANT_ID)", None
         
-        credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret
-        )
+        credential_key = (tenant_id, client_id, client_secret)
+        with _azure_clients_lock:
+            if _cached_credential is None or _cached_credential_key != credential_key:
+                _cached_credential = ClientSecretCredential(
+                    tenant_id=tenant_id,
+                    client_id=client_id,
+                    client_secret=client_secret
+                )
+                _cached_credential_key = credential_key
+                _cached_clients.clear()
+            credential = _cached_credential
         
         return True, None, credential
         
@@ -85,6 +226,160 @@ def get_azure_credential() -> Tuple[bool, Optional[str], Optional[ClientSecretCr
         return False, f"Failed to create Azure credential: {str(e)}", None
 
 
+def _create_shared_transport() -> RequestsTransport:
+    """
+    Create one HTTP transport shared by all management clients so TCP/TLS connections
+    to management.azure.com are pooled and reused (including by concurrent pollers).
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=20)
+    session.mount('https://', adapter)
+    # The default 300s connect/read timeouts would let one stalled socket hold a request
+    # well past the Functions HTTP timeout; fail fast and let the retry policy reconnect
+    return RequestsTransport(session=session, session_owner=False, connection_timeout=10, read_timeout=60)
+
+
+def get_management_clients(credential: 'ClientSecretCredential', subscription_id: str) -> Tuple['ComputeManagementClient', 'NetworkManagementClient', 'ResourceManagementClient']:
+    """Get the compute, network and resource management clients for a subscription (created once per process)."""
+    # The management SDKs are the largest imports in the app and dry run never uses them
+    from azure.mgmt.compute import ComputeManagementClient
+    from azure.mgmt.network import NetworkManagementClient
+    from azure.mgmt.resource import ResourceManagementClient
+    
+    with _azure_clients_lock:
+        clients = _cached_clients.get(subscription_id)
+        if clients is None:
+            transport = _create_shared_transport()
+            clients = (
+                ComputeManagementClient(credential, subscription_id, transport=transport),
+                NetworkManagementClient(credential, subscription_id, transport=transport),
+                ResourceManagementClient(credential, subscription_id, transport=transport)
+            )
+            _cached_clients[subscription_id] = clients
+        return clients
+
+
+@functools.lru_cache(maxsize=1)
+def _read_setup_script() -> str:
+    """Read the WireGuard setup script shipped with the function app (read once per process)."""
+    script_path = os.path.join(os.path.dirname(__file__), 'wireguard_docker_setup.sh')
+    with open(script_path, 'r') as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=1)
+def _render_cloud_init_base() -> str:
+    """Render the cloud-init YAML that installs and runs the setup script (rendered once per process)."""
+    script_content = _read_setup_script().rstrip('\n')
+
+    # Indent script content for cloud-init write_files block
+    indented_script = textwrap.indent(script_content, ' ' * 6)
+
+    return f"""#cloud-config
+
+write_files:
+  - path: /usr/local/bin/wireguard_docker_setup.sh
+    permissions: '0755'
+    content: |
+{indented_script}
+
+runcmd:
+  - [ bash, -c, "/usr/local/bin/wireguard_docker_setup.sh" ]
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def _encode_custom_data(cloud_init_config: str) -> str:
+    """Base64-encode cloud-init for VM customData (the common, VM-independent config is encoded once)."""
+    return base64.b64encode(cloud_init_config.encode('utf-8')).decode('utf-8')
+
+
+# Optional blob storage for the client config. The account key stays in the Functions
+# app: each VM only gets a short-lived SAS that can create/write its own blob, and
+# configs are read back through the backend's client.
+_CONFIG_BLOB_SAS_LIFETIME = timedelta(minutes=30)
+# cloud-init uploads the config only once the setup script has finished, well after ARM
+# reports the VM as Succeeded. Until this long after VM creation, status polls wait for
+# the blob; after it they fall back to Run Command.
+_CONFIG_BLOB_WAIT_SECONDS = 600
+
+
+def _get_config_container_settings() -> Optional[Tuple[str, str]]:
+    """Return (connection string, container name) if config blob storage is configured."""
+    connection_string = os.environ.get('WIREGUARD_CONFIG_STORAGE_CONNECTION_STRING')
+    if not connection_string:
+        return None
+    return connection_string, os.environ.get('WIREGUARD_CONFIG_CONTAINER', 'wireguard-configs')
+
+
+@functools.lru_cache(maxsize=1)
+def _get_config_container_client(connection_string: str, container_name: str):
+    """Create the container client used to sign upload URLs and read configs (created once per process)."""
+    from azure.storage.blob import ContainerClient
+    return ContainerClient.from_connection_string(connection_string, container_name)
+
+
+def get_config_blob_url(vm_name: str) -> Optional[str]:
+    """
+    Build the URL the VM uploads its client config to, if config blob storage is configured.
+    The SAS is scoped to this VM's blob, allows only create/write (no read) and expires
+    after _CONFIG_BLOB_SAS_LIFETIME, so it is safe to embed in the VM's customData.
+    """
+    settings = _get_config_container_settings()
+    if settings is None:
+        return None
+    
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+    
+    container_client = _get_config_container_client(*settings)
+    blob_name = f"{vm_name}.conf"
+    sas_token = generate_blob_sas(
+        account_name=container_client.account_name,
+        container_name=container_client.container_name,
+        blob_name=blob_name,
+        account_key=container_client.credential.account_key,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=datetime.now(timezone.utc) + _CONFIG_BLOB_SAS_LIFETIME,
+        protocol='https'
+    )
+    return f"{container_client.get_blob_client(blob_name).url}?{sas_token}"
+
+
+def get_vm_image_reference() -> Dict:
+    """
+    Get the image reference for new VMs.
+    WIREGUARD_VM_IMAGE_ID can point at a managed or gallery image with WireGuard tools
+    pre-installed, so first boot skips the package install.
+    """
+    image_id = os.environ.get('WIREGUARD_VM_IMAGE_ID')
+    if image_id:
+        return {'id': image_id}
+    
+    # Ubuntu 22.04 LTS for reliable cloud-init support and Docker compatibility
+    # This avoids Flatcar's Ignition provisioning issues on Azure
+    return {
+        'publisher': 'Canonical',
+        'offer': '0001-com-ubuntu-server-jammy',
+        'sku': '22_04-lts-gen2',
+        'version': 'latest'
+    }
+
+
+# Finished WireGuard client configs keyed by VM name, as (conf_text, public_ip). Only
+# written once the endpoint IP has been filled in, so anything here can be handed to
+# a client as-is. A VM's config never changes after first boot, so repeated status
+# polls skip the retrieval round-trip.
+_wireguard_config_cache: Dict[str, Tuple[str, str]] = {}
+_wireguard_config_cache_lock = threading.Lock()
+
+# In-flight Run Command pollers for config retrieval keyed by VM name. The SDK poller
+# polls on its own thread, so status requests only check whether it has finished.
+_pending_config_pollers: Dict[str, object] = {}
+# Placeholder held in _pending_config_pollers while a Run Command is being started, so
+# the ARM POST runs outside _wireguard_config_cache_lock without starting it twice
+_RUN_COMMAND_STARTING = object()
+
+
 class VMProvisioner:
     """Provisions and manages Azure VMs for WireGuard."""
     
@@ -97,6 +392,9 @@ class VMProvisioner:
         # Cache shared network resources
         self._shared_vnet = None
         self._shared_nsg = None
+        # Name of the WireGuard VM this process last found or created
+        self._current_vm_name = None
+        self._get_or_create_lock = threading.Lock()
         
         if not is_dry_run():
             success, error, credential = get_azure_credential()
@@ -104,8 +402,9 @@ class VMProvisioner:
                 raise ValueError(f"Cannot initialize VM provisioner: {error}")
             
             self.credential = credential
-            self.compute_client = ComputeManagementClient(credential, self.subscription_id)
-            self.network_client = NetworkManagementClient(credential, self.subscription_id)
+            self.compute_client, self.network_client, self.resource_client = get_management_clients(
+                credential, self.subscription_id
+            )
     
     def _get_resource_group_location(self) -> str:
         """Get the location of the resource group."""
@@ -117,8 +416,7 @@ class VMProvisioner:
             return 'westeurope'
         
         try:
-            resource_client = ResourceManagementClient(self.credential, self.subscription_id)
-            rg = resource_client.resource_groups.get(self.resource_group)
+            rg = self.resource_client.resource_groups.get(self.resource_group)
             self._resource_group_location = rg.location
             return self._resource_group_location
         except Exception as e:
@@ -142,88 +440,65 @@ class VMProvisioner:
             shared_vnet_name = 'wireguard-shared-vnet'
             shared_nsg_name = 'wireguard-shared-nsg'
             
-            # Check if NSG exists
-            try:
-                nsg = self.network_client.network_security_groups.get(
-                    self.resource_group,
-                    shared_nsg_name
-                )
+            # Look up the NSG and VNet concurrently; both are usually already present
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                nsg_future = executor.submit(self._get_existing_network_resource,
+                                             self.network_client.network_security_groups, shared_nsg_name)
+                vnet_future = executor.submit(self._get_existing_network_resource,
+                                              self.network_client.virtual_networks, shared_vnet_name)
+                nsg = nsg_future.result()
+                vnet = vnet_future.result()
+            
+            if nsg is not None:
                 logger.info(f"Using existing shared NSG: {shared_nsg_name}")
                 self._shared_nsg = nsg
-            except Exception:
+            else:
                 # Create NSG
                 logger.info(f"Creating shared NSG: {shared_nsg_name}")
                 nsg_params = {
                     'location': location,
-                    'security_rules': [
-                        {
-                            'name': 'AllowWireGuard',
-                            'protocol': 'Udp',
-                            'source_port_range': '*',
-                            'destination_port_range': '51820',
-                            'source_address_prefix': '*',
-                            'destination_address_prefix': '*',
-                            'access': 'Allow',
-                            'priority': 100,
-                            'direction': 'Inbound'
-                        },
-                        {
-                            'name': 'AllowSSHFromFunctions',
-                            'protocol': 'Tcp',
-                            'source_port_range': '*',
-                            'destination_port_range': '22',
-                            'source_address_prefixes': [
-                                '20.38.64.0/19',
-                                '20.39.0.0/16', 
-                                '20.40.0.0/13',
-                                '20.48.0.0/12',
-                                '20.64.0.0/10'
-                            ],
-                            'destination_address_prefix': '*',
-                            'access': 'Allow',
-                            'priority': 110,
-                            'direction': 'Inbound'
-                        }
-                    ]
+                    'security_rules': _NSG_SECURITY_RULES
                 }
                 
                 nsg_poller = self.network_client.network_security_groups.begin_create_or_update(
                     self.resource_group,
                     shared_nsg_name,
-                    nsg_params
+                    nsg_params,
+                    polling_interval=_LRO_POLLING_INTERVAL
                 )
+            
+            # The NSG's resource ID is deterministic, so the VNet PUT can be issued
+            # while the NSG is still provisioning instead of waiting for it first
+            nsg_id = nsg.id if nsg is not None else (
+                f"/subscriptions/{self.subscription_id}/resourceGroups/{self.resource_group}"
+                f"/providers/Microsoft.Network/networkSecurityGroups/{shared_nsg_name}"
+            )
+            vnet_poller = None
+            if vnet is None:
+                logger.info(f"Creating shared VNet: {shared_vnet_name}")
+                try:
+                    vnet_poller = self._begin_shared_vnet(shared_vnet_name, location, nsg_id)
+                except Exception as e:
+                    logger.warning(f"Could not start shared VNet creation yet, retrying after NSG: {e}")
+            
+            if nsg is None:
                 self._shared_nsg = nsg_poller.result()
                 logger.info(f"Created shared NSG: {shared_nsg_name}")
             
-            # Check if VNet exists
-            try:
-                vnet = self.network_client.virtual_networks.get(
-                    self.resource_group,
-                    shared_vnet_name
-                )
+            if vnet is not None:
                 logger.info(f"Using existing shared VNet: {shared_vnet_name}")
                 self._shared_vnet = vnet
-            except Exception:
-                # Create VNet
-                logger.info(f"Creating shared VNet: {shared_vnet_name}")
-                vnet_params = {
-                    'location': location,
-                    'address_space': {
-                        'address_prefixes': ['10.0.0.0/16']
-                    },
-                    'subnets': [{
-                        'name': 'default',
-                        'address_prefix': '10.0.0.0/24',
-                        'network_security_group': {'id': self._shared_nsg.id}
-                    }]
-                }
-                
-                vnet_poller = self.network_client.virtual_networks.begin_create_or_update(
-                    self.resource_group,
-                    shared_vnet_name,
-                    vnet_params
-                )
-                self._shared_vnet = vnet_poller.result()
+            else:
+                shared_vnet = None
+                if vnet_poller is not None:
+                    try:
+                        shared_vnet = vnet_poller.result()
+                    except Exception as e:
+                        logger.warning(f"Shared VNet creation failed while the NSG was provisioning, retrying: {e}")
+                if shared_vnet is None:
+                    # Now that the NSG is ready, create the VNet sequentially
+                    shared_vnet = self._begin_shared_vnet(shared_vnet_name, location, self._shared_nsg.id).result()
+                self._shared_vnet = shared_vnet
                 logger.info(f"Created shared VNet: {shared_vnet_name}")
             
             return self._shared_vnet, self._shared_nsg
@@ -232,6 +507,34 @@ class VMProvisioner:
             logger.error(f"Error creating/getting shared network resources: {str(e)}", exc_info=True)
             raise
     
+    def _begin_shared_vnet(self, vnet_name: str, location: str, nsg_id: str):
+        """Start creating the shared VNet whose default subnet uses the given NSG; returns the poller."""
+        vnet_params = {
+            'location': location,
+            'address_space': {
+                'address_prefixes': ['10.0.0.0/16']
+            },
+            'subnets': [{
+                'name': 'default',
+                'address_prefix': '10.0.0.0/24',
+                'network_security_group': {'id': nsg_id}
+            }]
+        }
+        
+        return self.network_client.virtual_networks.begin_create_or_update(
+            self.resource_group,
+            vnet_name,
+            vnet_params,
+            polling_interval=_LRO_POLLING_INTERVAL
+        )
+    
+    def _get_existing_network_resource(self, operations, name: str):
+        """Get a network resource by name, or None if it does not exist."""
+        try:
+            return operations.get(self.resource_group, name)
+        except ResourceNotFoundError:
+            return None
+    
     def get_or_create_vm(self, location: str = None, admin_username: str = 'azureuser') -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
         Get existing running WireGuard VM or create a new one (idempotent operation).
@@ -244,11 +547,11 @@ class VMProvisioner:
         
         if is_dry_run():
             logger.info(f"DRY RUN: Would get or create VM")
-            # In dry run, initialize operation and return as "accepted"
-            operation_id = f"dry-run-{int(time.time())}"
-            get_dry_run_status(operation_id)  # Initialize the operation
+            # In dry run, return the operation as "accepted"
+            now = int(time.time())
+            operation_id = f"dry-run-{now}"
             return True, None, {
-                'vmName': f'wg-{int(time.time())}',
+                'vmName': f'wg-{now}',
                 'operationId': operation_id,
                 'status': 'Creating',  # Start as creating
                 'publicIp': None,  # No IP yet
@@ -258,58 +561,75 @@ class VMProvisioner:
             }
         
         try:
-            # Check for existing VMs with wireguard tags
-            logger.info("Checking for existing WireGuard VM")
-            vms = self.compute_client.virtual_machines.list(self.resource_group)
-            
-            for vm in vms:
-                # Check if this is a WireGuard VM
-                if vm.tags and vm.tags.get('purpose') == 'wireguard-vpn':
-                    vm_name = vm.name
-                    logger.info(f"Found existing WireGuard VM: {vm_name}")
-                    
-                    # Check if it's running/succeeded
-                    if vm.provisioning_state in ['Succeeded', 'Creating', 'Updating']:
-                        # Return existing VM
-                        public_ip_name = f"{vm_name}-ip"
-                        try:
-                            public_ip = self.network_client.public_ip_addresses.get(
-                                self.resource_group,
-                                public_ip_name
-                            )
-                            ip_address = public_ip.ip_address
-                        except Exception:
-                            ip_address = None
-                        
-                        # For existing VM in 'Succeeded' state, retrieve the generated WireGuard config
-                        conf_text = None
-                        if vm.provisioning_state == 'Succeeded' and ip_address:
-                            # Retrieve WireGuard config via Run Command
-                            conf_text = self._retrieve_wireguard_config_via_run_command(vm_name)
-                            if not conf_text:
-                                # Fallback to sample config if retrieval fails
-                                conf_text = self._get_sample_config(ip_address)
+            # Serialize lookups so concurrent start_job requests on this worker can't both
+            # see no VM and create two; the second finds the first one's VM by name
+            with self._get_or_create_lock:
+                # The VM this process last found or created is checked with a single GET
+                # before falling back to listing the resource group
+                if self._current_vm_name:
+                    try:
+                        vm = self.compute_client.virtual_machines.get(self.resource_group, self._current_vm_name)
+                        if vm.provisioning_state in ['Succeeded', 'Creating', 'Updating']:
+                            logger.info(f"Found existing WireGuard VM: {vm.name}")
+                            return True, None, self._existing_vm_data(vm.name, vm.provisioning_state, vm.location)
+                    except ResourceNotFoundError:
+                        pass
+                    self._current_vm_name = None
+                
+                # Check for existing VMs with wireguard tags
+                logger.info("Checking for existing WireGuard VM")
+                # Filter by tag server-side instead of paging through every VM in the resource group.
+                # ARM does not allow combining a tag filter with a type filter, so the type is checked here.
+                tagged_resources = self.resource_client.resources.list_by_resource_group(
+                    self.resource_group,
+                    filter="tagName eq 'purpose' and tagValue eq 'wireguard-vpn'",
+                    expand='provisioningState'
+                )
+                
+                for vm in tagged_resources:
+                    # Check if this is a WireGuard VM
+                    if vm.type.lower() == 'microsoft.compute/virtualmachines':
+                        vm_name = vm.name
+                        logger.info(f"Found existing WireGuard VM: {vm_name}")
                         
-                        return True, None, {
-                            'vmName': vm_name,
-                            'operationId': vm_name,
-                            'status': vm.provisioning_state,
-                            'location': vm.location,
-                            'publicIp': ip_address,
-                            'publicIpName': public_ip_name,
-                            'resourceGroup': self.resource_group,
-                            'confText': conf_text,
-                            'isExisting': True
-                        }
-            
-            # No existing VM found, create a new one
-            logger.info("No existing WireGuard VM found, creating new one")
-            return self.create_vm(location, admin_username)
-            
+                        # Check if it's running/succeeded
+                        if vm.provisioning_state in ['Succeeded', 'Creating', 'Updating']:
+                            self._current_vm_name = vm_name
+                            return True, None, self._existing_vm_data(vm_name, vm.provisioning_state, vm.location)
+                
+                # No existing VM found, create a new one
+                logger.info("No existing WireGuard VM found, creating new one")
+                success, error_msg, operation_data = self.create_vm(location, admin_username)
+                if success:
+                    self._current_vm_name = operation_data['vmName']
+                return success, error_msg, operation_data
+        
         except Exception as e:
             logger.error(f"Error in get_or_create_vm: {str(e)}", exc_info=True)
             return False, f"Failed to get or create VM: {str(e)}", None
     
+    def _existing_vm_data(self, vm_name: str, provisioning_state: str, location: str) -> Dict:
+        """
+        Build the get_or_create_vm response for an existing VM. The public IP and WireGuard
+        config are looked up by get_vm_status when the client polls job_status, unless this
+        process already has the finished config in memory.
+        """
+        conf_text, public_ip = None, None
+        if provisioning_state == 'Succeeded':
+            with _wireguard_config_cache_lock:
+                conf_text, public_ip = _wireguard_config_cache.get(vm_name, (None, None))
+        return {
+            'vmName': vm_name,
+            'operationId': vm_name,
+            'status': provisioning_state,
+            'location': location,
+            'publicIp': public_ip,
+            'publicIpName': f"{vm_name}-ip",
+            'resourceGroup': self.resource_group,
+            'confText': conf_text,
+            'isExisting': True
+        }
+    
     def create_vm(self, location: str = None, admin_username: str = 'azureuser') -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
         Create a new VM for WireGuard asynchronously.
@@ -323,14 +643,12 @@ class VMProvisioner:
             location = self._get_resource_group_location()
         
         # Generate unique VM name
-        import time
         vm_name = f"wg-{int(time.time())}"
         
         if is_dry_run():
             logger.info(f"DRY RUN: Would create VM {vm_name} in {location}")
-            # In dry run, initialize operation and return as "creating"
+            # In dry run, return the operation as "creating"
             operation_id = f"dry-run-{vm_name}"
-            get_dry_run_status(operation_id)  # Initialize the operation
             return True, None, {
                 'vmName': vm_name,
                 'operationId': operation_id,
@@ -344,14 +662,12 @@ class VMProvisioner:
         try:
             logger.info(f"Starting async VM creation for {vm_name} in {location}")
             
-            # Get or create shared network resources (VNet and NSG)
-            shared_vnet, shared_nsg = self._get_or_create_shared_network_resources(location)
-            
             # Create VM-specific resources (Public IP and NIC)
             public_ip_name = f"{vm_name}-ip"
             nic_name = f"{vm_name}-nic"
             
-            # Step 1: Create Public IP
+            # Step 1: Start Public IP creation. It has no dependency on the shared
+            # network, so ARM provisions it while the NSG/VNet are fetched or created.
             public_ip_params = {
                 'location': location,
                 'sku': {'name': 'Standard'},
@@ -362,8 +678,18 @@ class VMProvisioner:
             public_ip_poller = self.network_client.public_ip_addresses.begin_create_or_update(
                 self.resource_group,
                 public_ip_name,
-                public_ip_params
+                public_ip_params,
+                polling_interval=_LRO_POLLING_INTERVAL
             )
+            
+            # Get or create shared network resources (VNet and NSG)
+            try:
+                shared_vnet, shared_nsg = self._get_or_create_shared_network_resources(location)
+            except Exception:
+                # The Public IP was started first and is billed on its own; don't leave it behind
+                self._discard_public_ip(public_ip_poller, public_ip_name)
+                raise
+            
             public_ip_result = public_ip_poller.result()
             
             # Step 2: Create Network Interface using shared VNet and NSG
@@ -381,7 +707,8 @@ class VMProvisioner:
             nic_poller = self.network_client.network_interfaces.begin_create_or_update(
                 self.resource_group,
                 nic_name,
-                nic_params
+                nic_params,
+                polling_interval=_LRO_POLLING_INTERVAL
             )
             nic_result = nic_poller.result()
             
@@ -390,7 +717,7 @@ class VMProvisioner:
             # This avoids Flatcar's Ignition provisioning issues on Azure
 
             # Create cloud-init configuration that sets up WireGuard during boot
-            cloud_init_config = self._generate_cloud_init_config()
+            cloud_init_config = self._generate_cloud_init_config(get_config_blob_url(vm_name))
 
             # Build os_profile supporting either SSH public key or admin password
             ssh_pub_key = os.environ.get('SSH_PUBLIC_KEY')
@@ -427,24 +754,10 @@ class VMProvisioner:
 
             vm_params = {
                 'location': location,
-                'hardware_profile': {
-                    'vm_size': 'Standard_B1ls'  # Cheapest size, sufficient for WireGuard
-                },
+                'hardware_profile': _VM_HARDWARE_PROFILE,
                 'storage_profile': {
-                    'image_reference': {
-                        # Ubuntu 22.04 LTS for reliable cloud-init support and Docker compatibility
-                        # This avoids Flatcar's Ignition provisioning issues on Azure
-                        'publisher': 'Canonical',
-                        'offer': '0001-com-ubuntu-server-jammy',
-                        'sku': '22_04-lts-gen2',
-                        'version': 'latest'
-                    },
-                    'os_disk': {
-                        'create_option': 'FromImage',
-                        'managed_disk': {
-                            'storage_account_type': 'Standard_LRS'
-                        }
-                    }
+                    'image_reference': get_vm_image_reference(),
+                    'os_disk': _VM_OS_DISK
                 },
                 'os_profile': os_profile,
                 'network_profile': {
@@ -452,18 +765,12 @@ class VMProvisioner:
                         'id': nic_result.id
                     }]
                 },
-                'tags': {
-                    'purpose': 'wireguard-vpn',
-                    'auto-delete': 'true',
-                    'created-by': 'wireguard-spa'
-                }
+                'tags': _VM_TAGS
             }
 
             # Add cloud-init config as customData for Ubuntu Linux
             if cloud_init_config:
-                vm_params['os_profile']['customData'] = base64.b64encode(
-                    cloud_init_config.encode('utf-8')
-                ).decode('utf-8')
+                vm_params['os_profile']['customData'] = _encode_custom_data(cloud_init_config)
             
             logger.info(f"Starting async VM creation for {vm_name}")
             # Start the operation but don't wait for it to complete
@@ -507,7 +814,7 @@ class VMProvisioner:
             if status == 'Succeeded':
                 response.update({
                     'publicIp': operation['public_ip'],
-                    'confText': self._get_sample_config(operation['public_ip'])
+                    'confText': _get_sample_config(operation['public_ip'])
                 })
             
             return True, None, response
@@ -517,101 +824,156 @@ class VMProvisioner:
             
             # Try to get the VM
             try:
+                # Plain GET is enough for the polling states; instanceView is only
+                # fetched on failure to get the error details
                 vm = self.compute_client.virtual_machines.get(
                     self.resource_group,
-                    vm_name,
-                    expand='instanceView'
+                    vm_name
                 )
-                
-                # VM exists, check its provisioning state
-                provisioning_state = vm.provisioning_state
-                
-                if provisioning_state == 'Succeeded':
-                    # Get the public IP
-                    public_ip_name = f"{vm_name}-ip"
-                    try:
-                        public_ip = self.network_client.public_ip_addresses.get(
-                            self.resource_group,
-                            public_ip_name
-                        )
-                        ip_address = public_ip.ip_address
-                    except Exception:
-                        ip_address = None
-                    
-                    # VM is ready, WireGuard should be set up via Ignition systemd service
-                    # Use Run Command to retrieve the generated client config
-                    logger.info(f"VM {vm_name} is ready, retrieving WireGuard config via Run Command")
-                    conf_text = self._retrieve_wireguard_config_via_run_command(vm_name)
-                    
-                    if conf_text:
-                        # Replace placeholder IP with actual public IP if needed
-                        if "REPLACE_WITH_PUBLIC_IP" in conf_text or conf_text.startswith("[Interface]"):
-                            conf_text = conf_text.replace("REPLACE_WITH_PUBLIC_IP", ip_address)
-                            # Also fix cases where IP detection failed and we have just ":51820"
-                            if ":51820" in conf_text and not ip_address in conf_text:
-                                conf_text = conf_text.replace(":51820", f"{ip_address}:51820")
-                        
-                        logger.info(f"WireGuard setup successful for VM {vm_name}")
-                        return True, None, {
-                            'vmName': vm_name,
-                            'status': 'Succeeded',
-                            'publicIp': ip_address,
-                            'confText': conf_text
-                        }
-                    else:
-                        # Setup failed
-                        logger.error(f"WireGuard setup failed for VM {vm_name}")
-                        return True, None, {
-                            'vmName': vm_name,
-                            'status': 'Failed',
-                            'error': 'WireGuard setup failed',
-                            'publicIp': ip_address
-                        }
-                elif provisioning_state in ['Creating', 'Updating']:
-                    return True, None, {
-                        'vmName': vm_name,
-                        'status': 'InProgress',
-                        'progress': f'VM provisioning state: {provisioning_state}'
-                    }
-                elif provisioning_state == 'Failed':
-                    # Get error details if available
-                    error_msg = "VM provisioning failed"
-                    if vm.instance_view and vm.instance_view.statuses:
-                        for status in vm.instance_view.statuses:
-                            if status.level == 'Error':
-                                error_msg = status.message or error_msg
-                    
-                    return True, None, {
-                        'vmName': vm_name,
-                        'status': 'Failed',
-                        'error': error_msg
-                    }
-                else:
-                    return True, None, {
-                        'vmName': vm_name,
-                        'status': provisioning_state,
-                        'progress': f'VM state: {provisioning_state}'
-                    }
-                    
-            except Exception as get_error:
-                # VM doesn't exist yet or other error
-                error_str = str(get_error)
-                if 'ResourceNotFound' in error_str or 'NotFound' in error_str:
-                    # VM creation might still be in progress
-                    return True, None, {
-                        'vmName': vm_name,
-                        'status': 'InProgress',
-                        'progress': 'VM creation in progress (resource not yet visible)'
-                    }
-                else:
-                    # Some other error
-                    logger.error(f"Error getting VM status: {error_str}")
-                    return False, f"Error querying VM status: {error_str}", None
+            except ResourceNotFoundError:
+                # VM creation might still be in progress
+                return True, None, {
+                    'vmName': vm_name,
+                    'status': 'InProgress',
+                    'progress': 'VM creation in progress (resource not yet visible)'
+                }
+            except HttpResponseError as get_error:
+                logger.error(f"Error getting VM status: {str(get_error)}")
+                return False, f"Error querying VM status: {str(get_error)}", None
+            
+            # VM exists, dispatch on its provisioning state
+            handler = self._VM_STATE_HANDLERS.get(vm.provisioning_state, VMProvisioner._vm_status_other)
+            return handler(self, vm, vm_name)
             
         except Exception as e:
             logger.error(f"Error checking VM status for {vm_name}: {str(e)}", exc_info=True)
             return False, f"Failed to check VM status: {str(e)}", None
     
+    def _get_public_ip_address(self, vm_name: str) -> Optional[str]:
+        """Get the VM's public IP address, or None if it cannot be read."""
+        public_ip_name = f"{vm_name}-ip"
+        try:
+            public_ip = self.network_client.public_ip_addresses.get(
+                self.resource_group,
+                public_ip_name
+            )
+            return public_ip.ip_address
+        except Exception:
+            return None
+    
+    def _vm_status_succeeded(self, vm, vm_name: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Build the status for a provisioned VM, retrieving its WireGuard client config."""
+        with _wireguard_config_cache_lock:
+            finished_config = _wireguard_config_cache.get(vm_name)
+        if finished_config:
+            conf_text, ip_address = finished_config
+            return True, None, {
+                'vmName': vm_name,
+                'status': 'Succeeded',
+                'publicIp': ip_address,
+                'confText': conf_text
+            }
+        
+        # Get the public IP (only needed, and only fetched, once the VM is provisioned).
+        # The config's endpoint needs it, so without it there is nothing to hand out yet.
+        ip_address = self._get_public_ip_address(vm_name)
+        if not ip_address:
+            return True, None, {
+                'vmName': vm_name,
+                'status': 'InProgress',
+                'progress': 'Waiting for public IP address'
+            }
+        
+        # VM is ready, WireGuard is set up by cloud-init during boot.
+        # Retrieve the generated client config without holding the request open.
+        logger.info(f"VM {vm_name} is ready, retrieving WireGuard config")
+        finished, conf_text = self._poll_wireguard_config(vm_name)
+        
+        if not finished:
+            return True, None, {
+                'vmName': vm_name,
+                'status': 'InProgress',
+                'progress': 'Retrieving WireGuard configuration',
+                'publicIp': ip_address
+            }
+        
+        if conf_text:
+            # Replace placeholder IP with actual public IP if needed
+            if "REPLACE_WITH_PUBLIC_IP" in conf_text or conf_text.startswith("[Interface]"):
+                conf_text = conf_text.replace("REPLACE_WITH_PUBLIC_IP", ip_address)
+                # Also fix cases where IP detection failed and we have just ":51820"
+                if ":51820" in conf_text and not ip_address in conf_text:
+                    conf_text = conf_text.replace(":51820", f"{ip_address}:51820")
+            
+            # Keep the finished config so start_job can hand it out directly
+            with _wireguard_config_cache_lock:
+                _wireguard_config_cache[vm_name] = (conf_text, ip_address)
+            
+            logger.info(f"WireGuard setup successful for VM {vm_name}")
+            return True, None, {
+                'vmName': vm_name,
+                'status': 'Succeeded',
+                'publicIp': ip_address,
+                'confText': conf_text
+            }
+        else:
+            # Setup failed
+            logger.error(f"WireGuard setup failed for VM {vm_name}")
+            return True, None, {
+                'vmName': vm_name,
+                'status': 'Failed',
+                'error': 'WireGuard setup failed',
+                'publicIp': ip_address
+            }
+    
+    def _vm_status_in_progress(self, vm, vm_name: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Build the status for a VM that is still being created or updated."""
+        return True, None, {
+            'vmName': vm_name,
+            'status': 'InProgress',
+            'progress': f'VM provisioning state: {vm.provisioning_state}'
+        }
+    
+    def _vm_status_failed(self, vm, vm_name: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Build the status for a VM whose provisioning failed."""
+        # Get error details if available
+        error_msg = "VM provisioning failed"
+        try:
+            vm = self.compute_client.virtual_machines.get(
+                self.resource_group,
+                vm_name,
+                expand='instanceView'
+            )
+        except Exception as e:
+            logger.warning(f"Could not get instance view for failed VM {vm_name}: {e}")
+        
+        if vm.instance_view and vm.instance_view.statuses:
+            for status in vm.instance_view.statuses:
+                if status.level == 'Error':
+                    error_msg = status.message or error_msg
+        
+        return True, None, {
+            'vmName': vm_name,
+            'status': 'Failed',
+            'error': error_msg
+        }
+    
+    def _vm_status_other(self, vm, vm_name: str) -> Tuple[bool, Optional[str], Optional[Dict]]:
+        """Build the status for any other provisioning state."""
+        return True, None, {
+            'vmName': vm_name,
+            'status': vm.provisioning_state,
+            'progress': f'VM state: {vm.provisioning_state}'
+        }
+    
+    # Provisioning state -> status builder used by get_vm_status
+    _VM_STATE_HANDLERS = {
+        'Succeeded': _vm_status_succeeded,
+        'Creating': _vm_status_in_progress,
+        'Updating': _vm_status_in_progress,
+        'Failed': _vm_status_failed,
+    }
+    
     def delete_vm(self, vm_name: str) -> Tuple[bool, Optional[str]]:
         """
         Delete a VM and all its associated resources.
@@ -621,38 +983,53 @@ class VMProvisioner:
             logger.info(f"DRY RUN: Would delete VM {vm_name}")
             return True, None
         
+        with _wireguard_config_cache_lock:
+            _wireguard_config_cache.pop(vm_name, None)
+            _pending_config_pollers.pop(vm_name, None)
+        if self._current_vm_name == vm_name:
+            self._current_vm_name = None
+        
         try:
             logger.info(f"Deleting VM {vm_name}")
             
-            # Delete VM
-            self.compute_client.virtual_machines.begin_delete(
-                self.resource_group,
-                vm_name
-            ).result()
-            
-            # Delete VM-specific resources (keep shared VNet and NSG)
-            nic_name = f"{vm_name}-nic"
-            public_ip_name = f"{vm_name}-ip"
-            
-            # Delete NIC
+            # Look up the OS disk first; it is not removed together with the VM.
+            # A VM that was never created needs no delete call of its own.
+            vm_exists = True
             try:
-                self.network_client.network_interfaces.begin_delete(
-                    self.resource_group,
-                    nic_name
-                ).result()
-                logger.info(f"Deleted NIC {nic_name}")
+                vm = self.compute_client.virtual_machines.get(self.resource_group, vm_name)
+                os_disk_name = vm.storage_profile.os_disk.name
+            except ResourceNotFoundError:
+                logger.info(f"VM {vm_name} does not exist, skipping VM and OS disk delete")
+                vm_exists = False
+                os_disk_name = None
             except Exception as e:
-                logger.warning(f"Could not delete NIC {nic_name}: {e}")
+                logger.warning(f"Could not look up OS disk for VM {vm_name}: {e}")
+                os_disk_name = None
             
-            # Delete Public IP
-            try:
-                self.network_client.public_ip_addresses.begin_delete(
+            # Delete VM. Force deletion skips the graceful guest shutdown; the VM
+            # holds no state worth preserving once it is being torn down.
+            if vm_exists:
+                self.compute_client.virtual_machines.begin_delete(
                     self.resource_group,
-                    public_ip_name
+                    vm_name,
+                    force_deletion=True,
+                    polling_interval=_LRO_POLLING_INTERVAL
                 ).result()
-                logger.info(f"Deleted Public IP {public_ip_name}")
-            except Exception as e:
-                logger.warning(f"Could not delete Public IP {public_ip_name}: {e}")
+            
+            # With the VM gone nothing can upload the config again
+            self._delete_config_blob(vm_name)
+            
+            # Delete VM-specific resources (keep shared VNet and NSG).
+            # The OS disk is independent, so its delete is started first and polls on its
+            # own while the NIC and then its Public IP are removed.
+            disk_poller = self._begin_os_disk_delete(os_disk_name) if os_disk_name else None
+            self._delete_vm_network_resources(vm_name)
+            if disk_poller is not None:
+                try:
+                    disk_poller.result()
+                    logger.info(f"Deleted OS disk {os_disk_name}")
+                except Exception as e:
+                    logger.warning(f"Could not delete OS disk {os_disk_name}: {e}")
             
             logger.info(f"VM {vm_name} and VM-specific resources deleted successfully (shared network resources preserved)")
             return True, None
@@ -661,17 +1038,68 @@ class VMProvisioner:
             logger.error(f"Error deleting VM {vm_name}: {str(e)}", exc_info=True)
             return False, f"Failed to delete VM: {str(e)}"
     
-    def _retrieve_wireguard_config_via_run_command(self, vm_name: str) -> Optional[str]:
-        """
-        Execute Azure Run Command to retrieve the generated WireGuard client config.
-        WireGuard setup happens during VM boot, this only retrieves the config.
-        Returns the WireGuard client configuration or None if retrieval fails.
-        """
+    def _delete_vm_network_resources(self, vm_name: str) -> None:
+        """Delete the VM's NIC and then its Public IP (the IP cannot be deleted while attached)."""
+        nic_name = f"{vm_name}-nic"
+        public_ip_name = f"{vm_name}-ip"
+        
+        # Delete NIC
         try:
-            logger.info(f"Executing Run Command on VM {vm_name} to retrieve WireGuard config")
-            
-            # Simple script to read the generated config
-            retrieve_script = """#!/bin/bash
+            self.network_client.network_interfaces.begin_delete(
+                self.resource_group,
+                nic_name,
+                polling_interval=_LRO_POLLING_INTERVAL
+            ).result()
+            logger.info(f"Deleted NIC {nic_name}")
+        except Exception as e:
+            logger.warning(f"Could not delete NIC {nic_name}: {e}")
+        
+        # Delete Public IP
+        try:
+            self.network_client.public_ip_addresses.begin_delete(
+                self.resource_group,
+                public_ip_name,
+                polling_interval=_LRO_POLLING_INTERVAL
+            ).result()
+            logger.info(f"Deleted Public IP {public_ip_name}")
+        except Exception as e:
+            logger.warning(f"Could not delete Public IP {public_ip_name}: {e}")
+    
+    def _discard_public_ip(self, public_ip_poller, public_ip_name: str) -> None:
+        """Delete a Public IP whose creation was started for a VM that will not be created."""
+        try:
+            # ARM rejects a delete while the create is still running, so let it finish first
+            public_ip_poller.result()
+        except Exception:
+            pass
+        try:
+            self.network_client.public_ip_addresses.begin_delete(
+                self.resource_group,
+                public_ip_name,
+                polling_interval=_LRO_POLLING_INTERVAL
+            ).result()
+            logger.info(f"Deleted Public IP {public_ip_name} after failed VM creation")
+        except Exception as e:
+            logger.warning(f"Could not delete Public IP {public_ip_name} after failed VM creation: {e}")
+    
+    def _begin_os_disk_delete(self, os_disk_name: str):
+        """Start deleting a VM's managed OS disk and return its poller, or None if it could not be started."""
+        try:
+            return self.compute_client.disks.begin_delete(
+                self.resource_group,
+                os_disk_name,
+                polling_interval=_LRO_POLLING_INTERVAL
+            )
+        except Exception as e:
+            logger.warning(f"Could not delete OS disk {os_disk_name}: {e}")
+            return None
+    
+    def _begin_config_run_command(self, vm_name: str):
+        """Start the Run Command that prints the VM's WireGuard client config and return its poller."""
+        logger.info(f"Executing Run Command on VM {vm_name} to retrieve WireGuard config")
+        
+        # Simple script to read the generated config
+        retrieve_script = """#!/bin/bash
 # Read the client config that was generated during boot by the WireGuard setup script
 if [ -f /etc/wireguard/client.conf ]; then
     cat /etc/wireguard/client.conf
@@ -680,45 +1108,135 @@ else
     exit 1
 fi
 """
+        
+        # Execute Run Command
+        run_command_params = {
+            'command_id': 'RunShellScript',
+            'script': retrieve_script.split('\n')
+        }
+        
+        logger.info(f"Starting Run Command on VM {vm_name}")
+        return self.compute_client.virtual_machines.begin_run_command(
+            self.resource_group,
+            vm_name,
+            run_command_params,
+            polling_interval=_RUN_COMMAND_POLLING_INTERVAL
+        )
+    
+    def _config_from_run_command_result(self, vm_name: str, result) -> Optional[str]:
+        """Extract the WireGuard client config from a finished Run Command result."""
+        if result.value and len(result.value) > 0:
+            output = result.value[0].message
+            logger.info(f"Run Command completed with output length: {len(output) if output else 0}")
             
-            # Execute Run Command
-            run_command_params = {
-                'command_id': 'RunShellScript',
-                'script': retrieve_script.split('\n')
-            }
-            
-            logger.info(f"Starting Run Command on VM {vm_name}")
-            poller = self.compute_client.virtual_machines.begin_run_command(
-                self.resource_group,
-                vm_name,
-                run_command_params
-            )
-            
-            # Wait for the command to complete (timeout after 1 minute, retrieval is fast)
-            logger.info("Waiting for Run Command to complete (timeout: 60s)...")
-            result = poller.result(timeout=60)
+            # Extract WireGuard config from output
+            conf_text = self._extract_wireguard_config(output)
             
-            # Extract output
-            if result.value and len(result.value) > 0:
-                output = result.value[0].message
-                logger.info(f"Run Command completed with output length: {len(output) if output else 0}")
-                
-                # Extract WireGuard config from output
-                conf_text = self._extract_wireguard_config(output)
-                
-                if conf_text:
-                    logger.info(f"Successfully retrieved WireGuard config from VM")
-                    return conf_text
-                else:
-                    logger.warning(f"Could not extract WireGuard config from output")
-                    logger.debug(f"Run Command output: {output[:500]}")
-                    return None
+            if conf_text:
+                logger.info(f"Successfully retrieved WireGuard config from VM")
+                return conf_text
             else:
-                logger.error(f"Run Command returned no output")
+                logger.warning(f"Could not extract WireGuard config from output")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Run Command output tail: %s", '\n'.join(output.splitlines()[-20:]))
                 return None
-                
+        else:
+            logger.error(f"Run Command returned no output")
+            return None
+    
+    def _poll_wireguard_config(self, vm_name: str) -> Tuple[bool, Optional[str]]:
+        """
+        Non-blocking config retrieval. With config blob storage configured, waits for the
+        blob uploaded by cloud-init (a single HTTPS GET per poll instead of a Run Command
+        LRO) until _CONFIG_BLOB_WAIT_SECONDS after VM creation. Otherwise, or after that,
+        starts the Run Command on the first call and collects its result on a later call
+        once it has finished.
+        Returns: (finished, conf_text) - conf_text is None if retrieval finished without a config
+        """
+        if _get_config_container_settings() is not None and not self._config_blob_wait_expired(vm_name):
+            conf_text = self._retrieve_wireguard_config_from_blob(vm_name)
+            return conf_text is not None, conf_text
+        
+        try:
+            with _wireguard_config_cache_lock:
+                poller = _pending_config_pollers.get(vm_name)
+                if poller is None:
+                    _pending_config_pollers[vm_name] = _RUN_COMMAND_STARTING
+                elif poller is _RUN_COMMAND_STARTING or not poller.done():
+                    return False, None
+                else:
+                    del _pending_config_pollers[vm_name]
+            
+            if poller is None:
+                new_poller = None
+                try:
+                    new_poller = self._begin_config_run_command(vm_name)
+                finally:
+                    with _wireguard_config_cache_lock:
+                        # delete_vm may have dropped the placeholder in the meantime
+                        if _pending_config_pollers.get(vm_name) is _RUN_COMMAND_STARTING:
+                            if new_poller is None:
+                                del _pending_config_pollers[vm_name]
+                            else:
+                                _pending_config_pollers[vm_name] = new_poller
+                return False, None
+            
+            return True, self._config_from_run_command_result(vm_name, poller.result())
+            
+        except HttpResponseError as e:
+            if e.status_code == 409:
+                # Another Functions instance already has a Run Command running on this VM;
+                # its result is not visible here, so keep polling until it finishes
+                logger.info(f"Run Command already in progress on VM {vm_name}, will retry")
+                return False, None
+            # ARM already describes the failure (e.g. VM agent not ready); no traceback needed
+            logger.error(f"Error executing Run Command on VM {vm_name}: {str(e)}")
+            return True, None
         except Exception as e:
             logger.error(f"Error executing Run Command on VM {vm_name}: {str(e)}", exc_info=True)
+            return True, None
+    
+    def _config_blob_wait_expired(self, vm_name: str) -> bool:
+        """Whether the VM (named 'wg-{creation timestamp}') has had _CONFIG_BLOB_WAIT_SECONDS to upload its config."""
+        suffix = vm_name.rsplit('-', 1)[-1]
+        return not suffix.isdigit() or time.time() - int(suffix) > _CONFIG_BLOB_WAIT_SECONDS
+    
+    def _delete_config_blob(self, vm_name: str) -> None:
+        """Delete the VM's uploaded client config (it holds the client private key), if blob storage is configured."""
+        settings = _get_config_container_settings()
+        if settings is None:
+            return
+        
+        try:
+            _get_config_container_client(*settings).delete_blob(f"{vm_name}.conf")
+            logger.info(f"Deleted WireGuard config blob for VM {vm_name}")
+        except ResourceNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Could not delete WireGuard config blob for VM {vm_name}: {e}")
+    
+    def _retrieve_wireguard_config_from_blob(self, vm_name: str) -> Optional[str]:
+        """
+        Download the WireGuard client config uploaded by the VM to blob storage.
+        Returns None if blob upload is not configured or the config is not there yet.
+        """
+        settings = _get_config_container_settings()
+        if settings is None:
+            return None
+        
+        try:
+            container_client = _get_config_container_client(*settings)
+            blob_text = container_client.download_blob(f"{vm_name}.conf", encoding='utf-8', timeout=10).readall()
+            conf_text = self._extract_wireguard_config(blob_text)
+            if conf_text:
+                logger.info(f"Retrieved WireGuard config for VM {vm_name} from blob storage")
+            return conf_text
+            
+        except ResourceNotFoundError:
+            logger.info(f"WireGuard config blob for VM {vm_name} not available yet")
+            return None
+        except Exception as e:
+            logger.warning(f"Could not download WireGuard config blob for VM {vm_name}: {e}")
             return None
     
     def _setup_wireguard_via_ssh(self, vm_name: str, ip_address: str) -> Optional[str]:
@@ -736,44 +1254,50 @@ fi
                 logger.error("SSH_PRIVATE_KEY environment variable not set")
                 return None
             
-            # Decode the base64 private key
+            # Decode and load the private key (cached after the first call)
             try:
-                ssh_private_key = base64.b64decode(ssh_private_key_b64).decode('utf-8')
+                private_key = _load_ssh_private_key(ssh_private_key_b64)
             except Exception as e:
-                logger.error(f"Failed to decode SSH private key: {str(e)}")
+                logger.error(f"Failed to load SSH private key: {str(e)}")
                 return None
             
             # Create SSH client
+            import paramiko
             ssh = paramiko.SSHClient()
             ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             
-            # Load private key
-            private_key = paramiko.RSAKey.from_private_key(io.StringIO(ssh_private_key))
-            
-            # Connect to VM
-            logger.info(f"SSH connecting to azureuser@{ip_address}")
-            ssh.connect(
-                hostname=ip_address,
-                username='azureuser',
-                pkey=private_key,
-                timeout=30
-            )
-            
-            # Execute the WireGuard setup script
-            setup_script_path = os.path.join(os.path.dirname(__file__), 'wireguard_docker_setup.sh')
-            with open(setup_script_path, 'r') as f:
-                setup_script = f.read()
-            
-            # Execute setup script
-            logger.info("Running WireGuard setup script via SSH")
-            stdin, stdout, stderr = ssh.exec_command(setup_script)
-            
-            # Read output
-            output = stdout.read().decode('utf-8')
-            error_output = stderr.read().decode('utf-8')
-            
-            # Close connection
-            ssh.close()
+            try:
+                # Connect to VM
+                logger.info(f"SSH connecting to azureuser@{ip_address}")
+                ssh.connect(
+                    hostname=ip_address,
+                    username='azureuser',
+                    pkey=private_key,
+                    timeout=30
+                )
+                # Detect dead connections promptly instead of waiting on TCP timeouts
+                ssh.get_transport().set_keepalive(30)
+                
+                # Execute the WireGuard setup script
+                setup_script = _read_setup_script()
+                
+                # Execute setup script
+                logger.info("Running WireGuard setup script via SSH")
+                stdin, stdout, stderr = ssh.exec_command(setup_script)
+                
+                # Drain stderr on a separate thread so a full stderr window
+                # cannot stall the remote script while stdout is being read
+                stderr_buf = []
+                stderr_thread = threading.Thread(target=lambda: stderr_buf.append(stderr.read()), daemon=True)
+                stderr_thread.start()
+                
+                # Read output
+                output = stdout.read().decode('utf-8')
+                stderr_thread.join()
+                error_output = b''.join(stderr_buf).decode('utf-8')
+            finally:
+                # Always close the connection, even if connect/exec/read fails
+                ssh.close()
             
             if error_output:
                 logger.warning(f"SSH setup script produced stderr: {error_output}")
@@ -803,45 +1327,43 @@ fi
         Looks for text between markers: === WIREGUARD_CLIENT_CONFIG_START === and === WIREGUARD_CLIENT_CONFIG_END ===
         """
         try:
-            # Find the config section in the output
-            start_marker = "=== WIREGUARD_CLIENT_CONFIG_START ==="
-            end_marker = "=== WIREGUARD_CLIENT_CONFIG_END ==="
+            # Scan once for both markers and the required sections
+            start_off = end_off = None
+            iface_seen = peer_seen = False
             
-            start_idx = output.find(start_marker)
-            end_idx = output.find(end_marker)
+            for match in _WIREGUARD_CONFIG_SCAN.finditer(output):
+                group = match.lastindex
+                if start_off is None:
+                    if group == 1:
+                        start_off = match.end()
+                elif group == 2:
+                    end_off = match.start()
+                    break
+                elif group == 3:
+                    iface_seen = True
+                elif group == 4:
+                    # [Peer] only counts once it follows [Interface]
+                    peer_seen = iface_seen
             
-            if start_idx != -1 and end_idx != -1:
-                # Extract the config text between markers
-                config_text = output[start_idx + len(start_marker):end_idx].strip()
-                
+            if start_off is not None and end_off is not None:
                 # Validate that it looks like a WireGuard config
-                if '[Interface]' in config_text and '[Peer]' in config_text:
+                if iface_seen and peer_seen:
+                    config_text = output[start_off:end_off].strip()
+                    # Run Command output can carry CRLF line endings; normalize them
+                    if '\r' in config_text:
+                        config_text = config_text.replace('\r\n', '\n')
                     return config_text
                 else:
                     logger.warning("Extracted text doesn't look like a valid WireGuard config")
                     return None
             else:
-                logger.warning(f"Could not find config markers in output (start: {start_idx}, end: {end_idx})")
+                logger.warning(f"Could not find config markers in output (start: {start_off is not None}, end: {end_off is not None})")
                 return None
                 
         except Exception as e:
             logger.error(f"Error extracting WireGuard config: {str(e)}", exc_info=True)
             return None
     
-    def _get_sample_config(self, public_ip: str = '203.0.113.42') -> str:
-        """Generate sample WireGuard configuration (fallback)."""
-        return f"""[Interface]
-PrivateKey = cOFA1gfMGvoDSJHKOlk5XaXDQZCOVAn3wR4SbQsXX3Q=
-Address = 10.13.13.2/24
-DNS = 1.1.1.1
-
-[Peer]
-PublicKey = n/fMKKDjMxKNvSZHQTWYUCYDcTGgTwMJkLc0X7rTgXo=
-Endpoint = {public_ip}:51820
-AllowedIPs = 0.0.0.0/0, ::/0
-PersistentKeepalive = 25
-"""
-
     def _generate_ignition_config(self) -> str:
         """
         Generate Ignition configuration for Flatcar Linux.
@@ -856,33 +1378,22 @@ PersistentKeepalive = 25
             logger.error(f"Error reading Ignition config: {str(e)}")
             return None
     
-    def _generate_cloud_init_config(self) -> str:
+    def _generate_cloud_init_config(self, config_blob_url: Optional[str] = None) -> str:
         """
         Generate cloud-init configuration that writes and runs the WireGuard Docker setup script.
         Returns the cloud-init YAML configuration as a string.
         Notes:
         - We embed the content of 'wireguard_docker_setup.sh' to keep a single source of truth.
         - The script saves the client config at /etc/wireguard/client.conf with extractable markers.
+        - If config_blob_url is given, the client config is also uploaded there after setup.
         """
         try:
-            script_path = os.path.join(os.path.dirname(__file__), 'wireguard_docker_setup.sh')
-            with open(script_path, 'r') as f:
-                script_content = f.read().rstrip('\n')
-
-            # Indent script content for cloud-init write_files block
-            indented_script = textwrap.indent(script_content, ' ' * 6)
-
-            cloud_config = f"""#cloud-config
-
-write_files:
-  - path: /usr/local/bin/wireguard_docker_setup.sh
-    permissions: '0755'
-    content: |
-{indented_script}
-
-runcmd:
-  - [ bash, -c, "/usr/local/bin/wireguard_docker_setup.sh" ]
-"""
+            cloud_config = _render_cloud_init_base()
+            if config_blob_url:
+                cloud_config += (
+                    "  - [ curl, -fsS, --retry, '5', -X, PUT, -H, 'x-ms-blob-type: BlockBlob', "
+                    f"--data-binary, '@/etc/wireguard/client.conf', '{config_blob_url}' ]\n"
+                )
             return cloud_config
         except Exception as e:
             logger.error(f"Error generating cloud-init config from script: {str(e)}", exc_info=True)
@@ -891,6 +1402,7 @@ runcmd:
 
 # Singleton instance
 _provisioner_instance = None
+_provisioner_lock = threading.Lock()
 
 
 def get_vm_provisioner() -> VMProvisioner:
@@ -898,6 +1410,10 @@ def get_vm_provisioner() -> VMProvisioner:
     global _provisioner_instance
     
     if _provisioner_instance is None:
-        _provisioner_instance = VMProvisioner()
+        # Concurrent first requests on a cold worker must not each build their own
+        # instance and lose the shared network/location caches of the others
+        with _provisioner_lock:
+            if _provisioner_instance is None:
+                _provisioner_instance = VMProvisioner()
     
     return _provisioner_instance
@@ -12,44 +12,48 @@ SERVER_ADDRESS="10.13.13.1"
 CLIENT_ADDRESS="10.13.13.2"
 DNS_SERVER="1.1.1.1"
 
-# Install WireGuard tools
-echo "Installing WireGuard tools..."
-if command -v apt >/dev/null 2>&1; then
-    # Ubuntu/Debian
-    echo "Detected apt package manager"
-    if apt update 2>/dev/null; then
-        echo "Package list updated successfully"
-        if apt install -y wireguard wireguard-tools 2>/dev/null; then
-            echo "WireGuard tools installed successfully"
+# Install WireGuard tools (skipped on images that already ship them)
+if command -v wg >/dev/null 2>&1; then
+    echo "WireGuard tools already installed, skipping package install"
+else
+    echo "Installing WireGuard tools..."
+    if command -v apt >/dev/null 2>&1; then
+        # Ubuntu/Debian
+        echo "Detected apt package manager"
+        if apt update 2>/dev/null; then
+            echo "Package list updated successfully"
+            if apt install -y wireguard wireguard-tools 2>/dev/null; then
+                echo "WireGuard tools installed successfully"
+            else
+                echo "ERROR: Failed to install wireguard-tools package"
+                exit 1
+            fi
         else
-            echo "ERROR: Failed to install wireguard-tools package"
-            exit 1
+            echo "ERROR: Failed to update package list (may need sudo in test environment)"
+            # For testing purposes, check if wg command already exists
+            if command -v wg >/dev/null 2>&1; then
+                echo "WireGuard tools already available, continuing..."
+            else
+                echo "ERROR: WireGuard tools not available and cannot install"
+                exit 1
+            fi
         fi
-    else
-        echo "ERROR: Failed to update package list (may need sudo in test environment)"
-        # For testing purposes, check if wg command already exists
-        if command -v wg >/dev/null 2>&1; then
-            echo "WireGuard tools already available, continuing..."
+    elif command -v tdnf >/dev/null 2>&1; then
+        # CBL-Mariner - try installing from source as fallback
+        echo "Installing WireGuard on CBL-Mariner..."
+        cd /tmp
+        curl -sL https://github.com/WireGuard/wireguard-tools/archive/refs/tags/v1.0.20210914.tar.gz | tar xz 2>/dev/null
+        cd wireguard-tools-*
+        if [ -f Makefile ]; then
+            make && make install >/dev/null 2>&1
         else
-            echo "ERROR: WireGuard tools not available and cannot install"
+            echo "Source installation failed, WireGuard tools not available"
             exit 1
         fi
-    fi
-elif command -v tdnf >/dev/null 2>&1; then
-    # CBL-Mariner - try installing from source as fallback
-    echo "Installing WireGuard on CBL-Mariner..."
-    cd /tmp
-    curl -sL https://github.com/WireGuard/wireguard-tools/archive/refs/tags/v1.0.20210914.tar.gz | tar xz 2>/dev/null
-    cd wireguard-tools-*
-    if [ -f Makefile ]; then
-        make && make install >/dev/null 2>&1
     else
-        echo "Source installation failed, WireGuard tools not available"
+        echo "ERROR: Unsupported package manager"
         exit 1
     fi
-else
-    echo "ERROR: Unsupported package manager"
-    exit 1
 fi
 
 # Check if wg command is available
@@ -9,11 +9,7 @@ import logging
 import json
 import azure.functions as func
 
-# Import shared modules
-import sys
-import os
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
+# The Functions host puts the app root (api/) on sys.path, so shared is importable directly
 from shared.auth import validate_user
 from shared.vm_provisioner import get_vm_provisioner
 
@@ -44,13 +40,15 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype="application/json"
             )
         
-        # Parse request body
+        # Parse request body (an empty body is common and needs no JSON parse)
+        body = req.get_body()
         try:
-            req_body = req.get_json()
+            req_body = json.loads(body) if body else {}
         except ValueError:
             req_body = {}
         
-        location = req_body.get('location', 'eastus')
+        # A non-object body (e.g. a JSON array) is a client error, not worth a traceback
+        location = req_body.get('location', 'eastus') if isinstance(req_body, dict) else 'eastus'
         
         logger.info(f"Getting or creating WireGuard VM (user: {user_email})")
         
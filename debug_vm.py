@@ -42,6 +42,24 @@ def load_credentials():
     print("✅ Azure credentials loaded")
     return True
 
+def wait_for_vm_running(provisioner, vm_name, timeout=90, interval=3):
+    """Poll the VM's power state until it is running (or the timeout passes)."""
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            instance_view = provisioner.compute_client.virtual_machines.instance_view(
+                provisioner.resource_group,
+                vm_name
+            )
+            if any(status.code == 'PowerState/running' for status in instance_view.statuses or []):
+                return True
+        except Exception:
+            # The VM may not be visible yet right after creation starts
+            pass
+        time.sleep(interval)
+    return False
+
 def debug_vm_immediately(vm_name):
     """Debug VM immediately after creation."""
     try:
@@ -73,14 +91,15 @@ echo "=== END DEBUG ==="
 
         run_command_params = {
             'command_id': 'RunShellScript',
-            'script': debug_script.split('\n')
+            'script': [debug_script]
         }
 
         print("🔍 Running debug command on VM...")
         poller = provisioner.compute_client.virtual_machines.begin_run_command(
             provisioner.resource_group,
             vm_name,
-            run_command_params
+            run_command_params,
+            polling_interval=2
         )
 
         result = poller.result(timeout=30)
@@ -119,10 +138,10 @@ def create_and_debug_vm():
         vm_name = result['vmName']
         print(f"✅ VM creation initiated: {vm_name}")
 
-        # Wait a bit for VM to be ready
-        print("⏳ Waiting 60 seconds for VM to initialize...")
-        import time
-        time.sleep(60)
+        # Wait for VM to be running
+        print("⏳ Waiting for VM to be running (up to 90 seconds)...")
+        if not wait_for_vm_running(provisioner, vm_name):
+            print("⚠️  VM not reported running yet, trying the debug command anyway")
 
         # Debug immediately
         debug_success = debug_vm_immediately(vm_name)
@@ -33,11 +33,11 @@ def load_credentials():
         'SSH_PUBLIC_KEY'
     ]
 
-    for var in required_vars:
-        if var not in values:
-            print(f"❌ Missing required setting: {var}")
-            return False
-        os.environ[var] = values[var]
+    missing = [var for var in required_vars if var not in values]
+    if missing:
+        print(f"❌ Missing required settings: {', '.join(missing)}")
+        return False
+    os.environ.update({var: values[var] for var in required_vars})
 
     # Ensure we're NOT in dry run mode
     os.environ['DRY_RUN'] = 'false'
@@ -45,16 +45,11 @@ def load_credentials():
     print("✅ Azure credentials loaded")
     return True
 
-def create_test_vm():
+def create_test_vm(provisioner):
     """Create a real test VM and monitor its progress."""
     print("🚀 Creating REAL test VM with WireGuard setup...")
 
     try:
-        from api.shared.vm_provisioner import get_vm_provisioner
-
-        provisioner = get_vm_provisioner()
-        print("✅ VM Provisioner initialized")
-
         # Create VM
         print("📡 Starting VM creation...")
         success, error, result = provisioner.get_or_create_vm(location='westeurope')
@@ -77,16 +72,19 @@ def create_test_vm():
         traceback.print_exc()
         return None
 
-def monitor_vm_status(vm_name, max_wait_minutes=10):
+def monitor_vm_status(provisioner, vm_name, max_wait_minutes=10):
     """Monitor VM creation and WireGuard setup progress."""
     print(f"📊 Monitoring VM: {vm_name}")
 
     try:
-        from api.shared.vm_provisioner import get_vm_provisioner
-
-        provisioner = get_vm_provisioner()
         start_time = time.time()
         max_wait_seconds = max_wait_minutes * 60
+        # Poll quickly at first, then back off: capped at 5s for the first 20s
+        # (the fastest plausible provision) and at 10s after that
+        next_delay = 1.0
+        # Progress lines are printed on a change, plus a heartbeat every 5s
+        last_message = None
+        last_message_at = 0
 
         while time.time() - start_time < max_wait_seconds:
             success, error, status_result = provisioner.get_vm_status(vm_name)
@@ -116,7 +114,7 @@ def monitor_vm_status(vm_name, max_wait_minutes=10):
                     return True
                 else:
                     print("❌ No WireGuard config retrieved - debugging VM...")
-                    debug_output = debug_vm(vm_name)
+                    debug_output = debug_vm(provisioner, vm_name)
                     if debug_output:
                         print("   Debug output from VM:")
                         print(f"   {debug_output}")
@@ -126,20 +124,24 @@ def monitor_vm_status(vm_name, max_wait_minutes=10):
                 error_msg = status_result.get('error', 'Unknown error')
                 print(f"❌ VM failed: {error_msg}")
                 # Still try to debug
-                debug_output = debug_vm(vm_name)
+                debug_output = debug_vm(provisioner, vm_name)
                 if debug_output:
                     print("   Debug output from failed VM:")
                     print(f"   {debug_output}")
                 return False
 
-            elif status in ['Creating', 'InProgress']:
-                progress = status_result.get('progress', '')
-                print(f"⏳ {status} ({elapsed}s) - {progress}")
-                time.sleep(10)  # Wait 10 seconds before next check
-
             else:
-                print(f"ℹ️  Status: {status} ({elapsed}s)")
-                time.sleep(5)
+                if status in ['Creating', 'InProgress']:
+                    message = f"⏳ {status} - {status_result.get('progress', '')}"
+                else:
+                    message = f"ℹ️  Status: {status}"
+                if message != last_message or elapsed - last_message_at >= 5:
+                    print(f"{message} ({elapsed}s)")
+                    last_message = message
+                    last_message_at = elapsed
+
+            time.sleep(next_delay)
+            next_delay = min(next_delay * 1.5, 5.0 if elapsed < 20 else 10.0)
 
         print(f"⏰ Timeout after {max_wait_minutes} minutes")
         return False
@@ -150,12 +152,9 @@ def monitor_vm_status(vm_name, max_wait_minutes=10):
         traceback.print_exc()
         return False
 
-def debug_vm(vm_name):
+def debug_vm(provisioner, vm_name):
     """Debug VM by running simple commands to see what's there."""
     try:
-        from api.shared.vm_provisioner import get_vm_provisioner
-        provisioner = get_vm_provisioner()
-
         # Try to see if the setup script exists and what happened
         debug_script = """
 #!/bin/bash
@@ -206,14 +205,15 @@ echo "=== END DEBUG ==="
 
         run_command_params = {
             'command_id': 'RunShellScript',
-            'script': debug_script.split('\n')
+            'script': [debug_script]
         }
 
         print("   Running debug command on VM...")
         poller = provisioner.compute_client.virtual_machines.begin_run_command(
             provisioner.resource_group,
             vm_name,
-            run_command_params
+            run_command_params,
+            polling_interval=2
         )
 
         result = poller.result(timeout=30)
@@ -224,14 +224,11 @@ echo "=== END DEBUG ==="
     except Exception as e:
         return f"Debug command failed: {e}"
 
-def cleanup_test_vm(vm_name):
+def cleanup_test_vm(provisioner, vm_name):
     """Clean up the test VM and associated resources."""
     print(f"🧹 Cleaning up test VM: {vm_name}")
 
     try:
-        from api.shared.vm_provisioner import get_vm_provisioner
-
-        provisioner = get_vm_provisioner()
         success, error = provisioner.delete_vm(vm_name)
 
         if success:
@@ -285,18 +282,28 @@ def main():
     if not load_credentials():
         return 1
 
+    # One provisioner (and one set of Azure clients) for the whole run
+    try:
+        from api.shared.vm_provisioner import get_vm_provisioner
+
+        provisioner = get_vm_provisioner()
+        print("✅ VM Provisioner initialized")
+    except Exception as e:
+        print(f"❌ Error initializing VM provisioner: {e}")
+        return 1
+
     # Create test VM
-    vm_name = create_test_vm()
+    vm_name = create_test_vm(provisioner)
     if not vm_name:
         return 1
 
     # Monitor progress
-    success = monitor_vm_status(vm_name, args.max_wait)
+    success = monitor_vm_status(provisioner, vm_name, args.max_wait)
 
     # Cleanup
     if not args.no_cleanup:
         print("\n" + "=" * 60)
-        cleanup_success = cleanup_test_vm(vm_name)
+        cleanup_success = cleanup_test_vm(provisioner, vm_name)
     else:
         print(f"\n⚠️  VM {vm_name} NOT cleaned up (use --no-cleanup for debugging)")
         print("   Remember to manually delete when done testing!")
@@ -6,7 +6,7 @@ This test uses DRY_RUN mode to avoid creating actual Azure resources.
 import sys
 import os
 import json
-import time
+import re
 from unittest.mock import Mock, patch
 
 # Add the api directory to the path
@@ -35,16 +35,23 @@ def test_vm_provisioner_dry_run():
             operation_id = result['operationId']
             print(f"✅ VM creation initiated: {vm_name} (operation: {operation_id})")
 
-            # Test status checking
+            # Test status checking. Dry run status depends only on the timestamp in the
+            # VM name, so backdated names walk the progression without sleeping.
             print("Testing status checking...")
-            for i in range(3):  # Check status a few times to simulate progression
-                success, error, status_result = provisioner.get_vm_status(vm_name)
-                if success and status_result:
-                    status = status_result['status']
-                    print(f"Status check {i+1}: {status}")
-                    if status == 'Succeeded':
-                        break
-                time.sleep(1)  # Small delay between checks
+            created_at = int(vm_name.rsplit('-', 1)[-1])
+            for age, expected in ((0, 'Creating'), (3, 'Running'), (8, 'Succeeded')):
+                success, error, status_result = provisioner.get_vm_status(f"wg-{created_at - age}")
+                if not success or not status_result:
+                    print(f"❌ Status check failed: {error}")
+                    return False
+                status = status_result['status']
+                print(f"Status after {age}s: {status}")
+                if status != expected:
+                    print(f"❌ Expected {expected}")
+                    return False
+            if not status_result.get('confText'):
+                print("❌ Succeeded status has no config")
+                return False
 
             print("✅ Status checking works")
         else:
@@ -76,26 +83,20 @@ def test_cloud_init_generation():
             print("✅ Cloud-init config generated successfully")
             print(f"Config length: {len(config)} characters")
 
-            # Check for expected content
-            if '#cloud-config' in config:
-                print("✅ Contains cloud-config header")
-            else:
-                print("❌ Missing cloud-config header")
-                return False
-
-            if 'wireguard_direct_setup.sh' in config:
-                print("✅ Contains WireGuard setup script reference")
-            else:
-                print("❌ Missing WireGuard setup script reference")
-                return False
-
-            if 'runcmd:' in config:
-                print("✅ Contains runcmd section")
-            else:
-                print("❌ Missing runcmd section")
-                return False
-
-            return True
+            # Check for expected content in a single scan of the config
+            expected = {
+                '#cloud-config': 'cloud-config header',
+                'wireguard_docker_setup.sh': 'WireGuard setup script reference',
+                'runcmd:': 'runcmd section'
+            }
+            found = set(re.findall('|'.join(map(re.escape, expected)), config))
+            for marker, description in expected.items():
+                if marker in found:
+                    print(f"✅ Contains {description}")
+                else:
+                    print(f"❌ Missing {description}")
+
+            return len(found) == len(expected)
         else:
             print("❌ Cloud-init config generation failed")
             return False
@@ -114,12 +115,15 @@ def test_api_endpoints():
         # Mock HTTP request
         class MockHttpRequest:
             def __init__(self, body=None):
-                self.body = body or '{}'
+                self.body = '{}' if body is None else body
                 self.headers = {}
 
             def get_json(self):
                 return json.loads(self.body)
 
+            def get_body(self):
+                return self.body.encode('utf-8')
+
         # Test start_job endpoint
         print("Testing start_job endpoint...")
         from api.start_job.__init__ import main as start_job_main
@@ -137,12 +141,29 @@ def test_api_endpoints():
                 print(f"❌ Start job endpoint failed with status {response.status_code}")
                 return False
 
+            # An empty body and a non-object JSON body both fall back to the default location
+            # start_job imports the provisioner as shared.vm_provisioner (api/ is on sys.path),
+            # a separate module object from api.shared.vm_provisioner
+            from shared.vm_provisioner import get_vm_provisioner
+            provisioner = get_vm_provisioner()
+            for body in ('', '["westeurope"]'):
+                with patch.object(provisioner, 'get_or_create_vm', wraps=provisioner.get_or_create_vm) as get_or_create_vm:
+                    response = start_job_main(MockHttpRequest(body))
+                if response.status_code != 202:
+                    print(f"❌ Start job with body {body!r} failed with status {response.status_code}")
+                    return False
+                location = get_or_create_vm.call_args.args[0]
+                if location != 'eastus':
+                    print(f"❌ Start job with body {body!r} used location {location}")
+                    return False
+            print("✅ Start job handles empty and non-object bodies")
+
         # Test job_status endpoint
         print("Testing job_status endpoint...")
         from api.job_status.__init__ import main as job_status_main
 
         req = MockHttpRequest()
-        req.route_params = {'id': 'test-vm-name'}
+        req.params = {'id': 'test-vm-name'}
 
         with patch.dict(os.environ, {'DRY_RUN': 'true'}):
             response = job_status_main(req)